@@ -1,16 +1,43 @@
+import asyncio
 import threading
+import queue
+import aiohttp
+import ijson
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import argparse
 import time
 import logging
 import sqlite3
 from sqlite3 import Error
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import os
+from urllib.parse import urlsplit, parse_qsl
 
 requests.packages.urllib3.disable_warnings()
 logging.basicConfig(level=logging.INFO)
 
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=1)))
+SESSION.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=1)))
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'}
+_RANGE_HEADERS = {'Range': 'bytes=0-0'}
+_PROBE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+_REPORT_ENV = Environment(loader=FileSystemLoader(os.path.abspath(os.path.dirname(__file__))),
+                          bytecode_cache=FileSystemBytecodeCache(), auto_reload=False)
+
+@functools.lru_cache(maxsize=None)
+def _report_template():
+    # Loaded on first use so importing the module doesn't require the template file
+    return _REPORT_ENV.get_template("report_template.html")
+
 class DomainExtractor:
     def __init__(self, domain, want_subdomain, thread_number, response_time_threshold, db_filename, report_filename):
         self.domain = domain
@@ -19,14 +46,23 @@ class DomainExtractor:
         self.final_url_list = set()
         self.potential_race_conditions = []
         self.response_time_threshold = response_time_threshold
+        self.response_time_threshold_ns = int(response_time_threshold * 1e9)
         self.db_filename = db_filename
         self.report_filename = report_filename
+        self._pending_rows = queue.Queue()
+        self._db_writer = None
 
         self.create_db()
 
     def create_db(self):
         try:
-            self.conn = sqlite3.connect(self.db_filename)
+            # Rows are inserted by the writer thread and read back on the main thread for the report
+            self.conn = sqlite3.connect(self.db_filename, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('PRAGMA wal_autocheckpoint=1000')
+            self.conn.execute('PRAGMA temp_store=MEMORY')
+            self.conn.execute('PRAGMA cache_size=-64000')
             self.cursor = self.conn.cursor()
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS race_conditions (
@@ -41,32 +77,55 @@ class DomainExtractor:
             self.conn = None
 
     def start(self):
-        self.extract_urls_from_wayback_machine()
-        self.extract_urls_from_otx()
+        # Both sources are independent network round-trips; fetch them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda extract: extract(),
+                              [self.extract_urls_from_wayback_machine, self.extract_urls_from_otx]))
+        self.deduplicate_urls()
         return self.final_url_list
 
+    def deduplicate_urls(self):
+        # URLs that differ only in query-string values hit the same endpoint; probe one of each.
+        def endpoint_key(url):
+            parts = urlsplit(url)
+            query_keys = tuple(sorted(key for key, _ in parse_qsl(parts.query, keep_blank_values=True)))
+            return parts.scheme, parts.netloc.lower(), parts.path, query_keys
+
+        unique_urls = {}
+        for url in sorted(self.final_url_list):
+            try:
+                unique_urls.setdefault(endpoint_key(url), url)
+            except ValueError:
+                unique_urls.setdefault(url, url)
+        self.final_url_list = set(unique_urls.values())
+
     def extract_urls_from_wayback_machine(self):
         wild_card = "*." if self.want_subdomain else ""
         url = f"http://web.archive.org/cdx/search/cdx?url={wild_card + self.domain}/*&output=json&collapse=urlkey&fl=original"
 
-        response = requests.get(url, verify=False)
-        if response.status_code == 200:
-            data = response.json()
-            try:
-                urls_list = data[1:]  # Skip the first line
-                final_urls_list = {item[0] for item in urls_list}
-                self.final_url_list.update(final_urls_list)
-            except Exception as e:
-                pass
-                #logging.error(f"Failed to extract URLs from WaybackMachine: {str(e)}")
-        else:
+        try:
+            with SESSION.get(url, verify=False, stream=True, timeout=60) as response:
+                if response.status_code == 200:
+                    try:
+                        # Stream rows out of the CDX array instead of materialising the whole JSON document
+                        response.raw.decode_content = True
+                        rows = ijson.items(response.raw, 'item')
+                        next(rows, None)  # Skip the first line
+                        self.final_url_list.update(row[0] for row in rows)
+                    except Exception as e:
+                        pass
+                        #logging.error(f"Failed to extract URLs from WaybackMachine: {str(e)}")
+                else:
+                    pass
+                    #logging.error(f"Failed to fetch data from WaybackMachine. Status code: {response.status_code}")
+        except requests.exceptions.RequestException as e:
             pass
-            #logging.error(f"Failed to fetch data from WaybackMachine. Status code: {response.status_code}")
+            #logging.error(f"Failed to fetch data from WaybackMachine: {str(e)}")
 
     def extract_urls_from_otx(self):
         url = f"https://otx.alienvault.com/api/v1/indicators/hostname/{self.domain}/url_list"
         try:
-            response = requests.get(url, verify=False)
+            response = SESSION.get(url, verify=False)
             response.raise_for_status()  # Raise an exception for HTTP errors
 
             data = response.json()
@@ -82,38 +141,62 @@ class DomainExtractor:
 
     def test_race_conditions(self):
         url_list = list(self.final_url_list)
+        concurrency = max(1, self.thread_number) * 100
 
-        def send_request_with_timing(url):
-            start_time = time.time()
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'}
-                response = requests.get(url, headers=headers, verify=False, timeout=10, allow_redirects=True)
-                end_time = time.time()
-                response_time = end_time - start_time
-
-                if response_time < self.response_time_threshold:
-                    self.potential_race_conditions.append(
-                        {
-                            "url": url,
-                            "status_code": response.status_code,
-                            "response_time": response_time,
-                        }
-                    )
-                    self.save_to_db(url, response.status_code, response_time)
-
-            except requests.exceptions.RequestException as e:
-                pass
+        # Probe results are kept as columns indexed like url_list; failed probes keep the sentinel time.
+        response_times_ns = np.full(len(url_list), np.iinfo(np.int64).max, dtype=np.int64)
+        status_codes = np.zeros(len(url_list), dtype=np.int32)
+
+        async def send_request_with_timing(session, semaphore, index, url):
+            async with semaphore:
+                start_time = time.perf_counter_ns()
+                try:
+                    async with session.head(url, allow_redirects=True) as response:
+                        status_code = response.status
+                    if status_code in (405, 501):
+                        # HEAD not supported: time a single-byte GET instead, without reading the body
+                        start_time = time.perf_counter_ns()
+                        async with session.get(url, headers=_RANGE_HEADERS, allow_redirects=True) as response:
+                            status_code = response.status
+                    elapsed_ns = time.perf_counter_ns() - start_time
+                    response_times_ns[index] = elapsed_ns
+                    status_codes[index] = status_code
+
+                    if elapsed_ns < self.response_time_threshold_ns:
+                        self.save_to_db(url, status_code, elapsed_ns / 1e9)
+
+                except Exception as e:
+                    # Any failure (network errors, or aiohttp rejecting a malformed archived URL) only skips this URL
+                    pass
                     #logging.error(f"URL: {url}, Error: {str(e)}")
 
-        threads = []
-        for url in url_list:
-            thread = threading.Thread(target=send_request_with_timing, args=(url,))
-            threads.append(thread)
-            thread.start()
+        async def send_all_requests():
+            # One event loop multiplexes every probe; the semaphore bounds in-flight requests so
+            # time spent waiting for a free slot is not counted as response time. Each host is
+            # resolved once and cached for the rest of the scan.
+            semaphore = asyncio.Semaphore(concurrency)
+            connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=None, ssl=False)
+            async with aiohttp.ClientSession(connector=connector, headers=_HEADERS, timeout=_PROBE_TIMEOUT) as session:
+                await asyncio.gather(*(send_request_with_timing(session, semaphore, index, url)
+                                     for index, url in enumerate(url_list)))
 
-        for thread in threads:
-            thread.join()
+        self.start_db_writer()
+        try:
+            asyncio.run(send_all_requests())
+        finally:
+            hits = np.flatnonzero(response_times_ns < self.response_time_threshold_ns)
+            hits = hits[np.argsort(response_times_ns[hits], kind='stable')]
+            hit_times = (response_times_ns[hits] / 1e9).tolist()
+            hit_codes = status_codes[hits].tolist()
+            for index, status_code, response_time in zip(hits.tolist(), hit_codes, hit_times):
+                self.potential_race_conditions.append(
+                    {
+                        "url": url_list[index],
+                        "status_code": status_code,
+                        "response_time": response_time,
+                    }
+                )
+            self.flush_to_db()
 
         if self.potential_race_conditions:
             logging.info("\n[>>] [Potential Race Conditions]:")
@@ -123,11 +206,45 @@ class DomainExtractor:
                     f"Response Time: {condition['response_time']} seconds"
                 )
 
+    def start_db_writer(self):
+        if self.conn and self._db_writer is None:
+            self._db_writer = threading.Thread(target=self._write_pending_rows, daemon=True)
+            self._db_writer.start()
+
+    def _write_pending_rows(self):
+        # Coalesce whatever has queued up into one transaction, so commits never hold up the probes.
+        while True:
+            batch = [self._pending_rows.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._pending_rows.get_nowait())
+                except queue.Empty:
+                    break
+
+            finished = batch[-1] is None
+            rows = [row for row in batch if row is not None]
+            if rows:
+                try:
+                    with self.conn:
+                        self.conn.executemany(
+                            'INSERT INTO race_conditions (url, status_code, response_time) VALUES (?, ?, ?)', rows)
+                except Error as e:
+                    pass
+                    #logging.error(f"Failed to save results to the database: {str(e)}")
+            if finished:
+                return
+
     def save_to_db(self, url, status_code, response_time):
         if self.conn:
-            self.cursor.execute('INSERT INTO race_conditions (url, status_code, response_time) VALUES (?, ?, ?)',
-                                (url, status_code, response_time))
-            self.conn.commit()
+            self._pending_rows.put((url, status_code, response_time))
+
+    def flush_to_db(self):
+        if self._db_writer is None:
+            return
+
+        self._pending_rows.put(None)
+        self._db_writer.join()
+        self._db_writer = None
 
     def generate_report(self):
         if not self.conn:
@@ -136,17 +253,19 @@ class DomainExtractor:
         self.cursor.execute('SELECT * FROM race_conditions')
         rows = self.cursor.fetchall()
 
-        env = Environment(loader=FileSystemLoader(os.path.abspath(os.path.dirname(__file__))))
-        template = env.get_template("report_template.html")
+        _report_template().stream(rows=rows).dump(self.report_filename)
 
-        with open(self.report_filename, "w") as report_file:
-            report_file.write(template.render(rows=rows))
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Concurrent URL Request Testing')
     parser.add_argument('domain', help='Domain to extract URLs from')
     parser.add_argument('-s', '--subdomain', action='store_true', help='Include subdomains')
-    parser.add_argument('-t', '--threads', type=int, default=5, help='Number of concurrent threads')
+    parser.add_argument('-t', '--threads', type=positive_int, default=5, help='Concurrency factor (x100 in-flight requests)')
     parser.add_argument('-r', '--response-time-threshold', type=float, default=0.1, help='Response time threshold for potential race conditions')
     parser.add_argument('--db', default='race_conditions.db', help='Database filename')
     parser.add_argument('--report', default='race_conditions_report.html', help='HTML report filename')
@@ -0,0 +1,54 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from racecondition import DomainExtractor
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_malformed_urls_do_not_abort_scan(tmp_path, local_server):
+    extractor = DomainExtractor('example.com', False, 1, 5.0,
+                                str(tmp_path / 'race_conditions.db'), str(tmp_path / 'report.html'))
+    good_urls = {f"{local_server}/page{i}" for i in range(200)}
+    extractor.final_url_list = good_urls | {"http://www..example.com/", "//x.com/a"}
+
+    extractor.test_race_conditions()
+
+    assert {condition['url'] for condition in extractor.potential_race_conditions} == good_urls
+    extractor.cursor.execute('SELECT COUNT(*) FROM race_conditions')
+    assert extractor.cursor.fetchone()[0] == len(good_urls)
+
+
+@pytest.mark.parametrize('thread_number', [0, -1])
+def test_non_positive_thread_number_still_probes(tmp_path, local_server, thread_number):
+    extractor = DomainExtractor('example.com', False, thread_number, 5.0,
+                                str(tmp_path / 'race_conditions.db'), str(tmp_path / 'report.html'))
+    extractor.final_url_list = {f"{local_server}/page"}
+
+    extractor.test_race_conditions()
+
+    assert [condition['url'] for condition in extractor.potential_race_conditions] == [f"{local_server}/page"]